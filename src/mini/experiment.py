@@ -40,6 +40,7 @@ class Experiment:
     """A distributed experiment runner."""
 
     output_handler: Callback[str]
+    """Receives output from remote functions. Each call may contain several lines."""
     volumes: dict[str | PurePosixPath, modal.Volume | modal.CloudBucketMount]
     """Default volumes to use for all @thither functions."""
     image: modal.Image | None
@@ -70,6 +71,7 @@ class Experiment:
 
             async for output in self.app._logs.aio():
                 lines = output.splitlines(keepends=True)
+                pending: list[str] = []
                 for line in lines:
                     if is_mini_urn(line):
                         if CallState.matches(line.strip()):
@@ -81,7 +83,11 @@ class Experiment:
 
                     if fn_tracker.any_running():
                         # Only print output if there are running functions to avoid printing infra messages too
-                        self.output_handler(line)
+                        pending.append(line)
+
+                if pending:
+                    # One write per chunk of logs rather than per line
+                    self.output_handler(''.join(pending))
                 # No need to break: the loop should exit when the app is done
 
             if fn_tracker.any_active():
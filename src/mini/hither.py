@@ -1,11 +1,14 @@
+import asyncio
+import inspect
 import logging
 from contextlib import AbstractAsyncContextManager, AsyncContextDecorator, asynccontextmanager
 from functools import wraps
-from typing import Any, AsyncGenerator, Callable, ParamSpec, TypeAlias, TypeVar, overload
+from typing import Any, AsyncGenerator, Callable, Coroutine, ParamSpec, TypeAlias, TypeVar, cast, overload
 
 from mini._mode_detect import detect_mode
 from mini.local_dispatch import send_batch_to
-from mini.types import AsyncCallable, Params
+from mini.types import AsyncCallable, Handler, Params
+from mini.utils import is_async_function
 
 T = TypeVar('T')
 P = ParamSpec('P')
@@ -49,27 +52,50 @@ AsyncBatchCallbackContextDecorator: TypeAlias = Factory[AsyncContextDecorator |
 
 # Non-batch overloads
 @overload
-def run_hither(callback: AsyncCallback[P]) -> CallbackContextManager[P]: ...
+def run_hither(
+    callback: AsyncCallback[P],
+    *,
+    concurrency: int = 1,
+    yield_every: int = 1024,
+) -> CallbackContextManager[P]: ...
 
 
 @overload
-def run_hither(callback: Factory[AsyncCallback[P]]) -> Factory[CallbackContextManager[P]]: ...
+def run_hither(
+    callback: Factory[AsyncCallback[P]],
+    *,
+    concurrency: int = 1,
+    yield_every: int = 1024,
+) -> Factory[CallbackContextManager[P]]: ...
 
 
 @overload
-def run_hither(callback: AsyncCallbackContextManager[P]) -> CallbackContextManager[P]: ...
+def run_hither(
+    callback: AsyncCallbackContextManager[P],
+    *,
+    concurrency: int = 1,
+    yield_every: int = 1024,
+) -> CallbackContextManager[P]: ...
 
 
 @overload
-def run_hither(callback: AsyncCallbackContextDecorator[P]) -> Factory[CallbackContextManager[P]]: ...
+def run_hither(
+    callback: AsyncCallbackContextDecorator[P],
+    *,
+    concurrency: int = 1,
+    yield_every: int = 1024,
+) -> Factory[CallbackContextManager[P]]: ...
 
 
-def run_hither(callback):  # type: ignore
+def run_hither(callback, *, concurrency: int = 1, yield_every: int = 1024):  # type: ignore
     """
     Run a callback locally, even when called in a remote Modal worker.
 
     Args:
         callback: The callback to run locally (see below)
+        concurrency: Maximum number of calls to run at once when several arrive in the same batch.
+            The default of 1 runs them one at a time, in the order they were sent.
+        yield_every: When running calls one at a time, how many to run before yielding to the event loop.
 
     - An **async** function (bare callback)
     - A regular function that returns an **async** function.
@@ -80,17 +106,26 @@ def run_hither(callback):  # type: ignore
         stub:
         A function that takes the same parameters as `callback`, but which just puts the request on a queue and returns immediately. It returns `None`, even if `callback` returns something else.
     """
+    if concurrency < 1:
+        raise ValueError(f'concurrency must be at least 1, got {concurrency}')
+    if yield_every < 1:
+        raise ValueError(f'yield_every must be at least 1, got {yield_every}')
+
     mode = detect_mode(callback)
     if mode == 'callback':
-        return _run_hither(callback)
+        return _run_hither(callback, concurrency=concurrency, yield_every=yield_every)
     elif mode == 'factory':
         # return a function that instantiates the callback and wraps it in our context manager
-        return lambda *args, **kwargs: _run_hither(callback(*args, **kwargs))
+        return lambda *args, **kwargs: _run_hither(
+            callback(*args, **kwargs), concurrency=concurrency, yield_every=yield_every
+        )
     elif mode == 'cm':
-        return _run_hither_cm(callback)
+        return _run_hither_cm(callback, concurrency=concurrency, yield_every=yield_every)
     elif mode == 'cm_factory':
         # return a function that instantiates the context manager and wraps it in *our* context manager
-        return lambda *args, **kwargs: _run_hither_cm(callback(*args, **kwargs))
+        return lambda *args, **kwargs: _run_hither_cm(
+            callback(*args, **kwargs), concurrency=concurrency, yield_every=yield_every
+        )
     else:
         raise ValueError(f'Invalid mode: {mode}')
 
@@ -145,14 +180,73 @@ def run_hither_batch(callback):  # type: ignore
         raise ValueError(f'Invalid mode: {mode}')
 
 
+def _batched(callback: AsyncCallback[P], concurrency: int, yield_every: int) -> Handler[list[Params[P]]]:
+    """Make a function that dispatches a batch of calls to `callback`."""
+    named = wraps(callback, assigned=('__module__', '__name__', '__qualname__', '__doc__'))
+
+    # Choose the dispatch loop once, rather than checking on every call.
+    if not is_async_function(callback):
+        # Synchronous callbacks (e.g. yielded by a context manager) don't need
+        # to be wrapped in a coroutine per call. Other callables can still
+        # return awaitables (e.g. objects with an async __call__), so await
+        # any results that are.
+        @named
+        async def call_each(calls: list[Params[P]]) -> None:
+            for call in calls:
+                result = callback(*call.args, **call.kwargs)
+                if inspect.isawaitable(result):
+                    await result
+
+        return call_each
+
+    elif concurrency == 1:
+
+        @named
+        async def await_each(calls: list[Params[P]]) -> None:
+            # Preserve call order
+            for i, call in enumerate(calls, 1):
+                await callback(*call.args, **call.kwargs)
+                if i % yield_every == 0:
+                    # Awaiting a callback that never suspends doesn't yield to the event loop,
+                    # so a large batch could starve other tasks.
+                    await asyncio.sleep(0)
+
+        return await_each
+
+    else:
+        return named(_gather_each(callback, concurrency))
+
+
+def _gather_each(callback: AsyncCallback[P], concurrency: int) -> AsyncCallable[[list[Params[P]]], None]:
+    """Make a function that runs a batch of calls concurrently, up to a limit."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def direct_callback(call: Params[P]) -> Coroutine[Any, Any, Any | None]:
+        # _batched only sends coroutine functions here, so this returns a coroutine.
+        return cast(Coroutine[Any, Any, Any | None], callback(*call.args, **call.kwargs))
+
+    async def limited_callback(call: Params[P]) -> None:
+        async with semaphore:
+            await callback(*call.args, **call.kwargs)
+
+    async def gather_each(calls: list[Params[P]]) -> None:
+        # If the limit can't be reached, dispatch directly without the semaphore wrapper.
+        dispatch = direct_callback if len(calls) <= concurrency else limited_callback
+        # Unlike gather, a task group cancels the other calls when one fails.
+        async with asyncio.TaskGroup() as tg:
+            for call in calls:
+                tg.create_task(dispatch(call))
+
+    return gather_each
+
+
 @asynccontextmanager
 async def _run_hither(
     callback: AsyncCallback[P],
+    concurrency: int = 1,
+    yield_every: int = 1024,
 ) -> AsyncGenerator[Callback[P]]:
-    @wraps(callback, assigned=('__module__', '__name__', '__qualname__', '__doc__'))
-    async def batched_callback(calls: list[Params[P]]) -> None:
-        for call in calls:
-            await callback(*call.args, **call.kwargs)
+    batched_callback = _batched(callback, concurrency, yield_every)
 
     log.debug('Starting producer and consumer for %s', callback)
     async with send_batch_to(batched_callback) as send_batch:
@@ -187,10 +281,12 @@ async def _run_hither_batch(
 @asynccontextmanager
 async def _run_hither_cm(
     cb_context: AsyncCallbackContextManager[P],
+    concurrency: int = 1,
+    yield_every: int = 1024,
 ) -> AsyncGenerator[Callback[P]]:
     log.debug('Entering callback context %s', cb_context)
     async with cb_context as callback:
-        async with _run_hither(callback) as send:
+        async with _run_hither(callback, concurrency=concurrency, yield_every=yield_every) as send:
             yield send
 
 
@@ -1,30 +1,53 @@
 import asyncio
-from functools import wraps
+from collections import deque
+from functools import partial, wraps
+from itertools import islice
 import logging
+import time
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator, TypeVar
+from dataclasses import dataclass
+from enum import Enum
+from typing import AsyncGenerator, Callable, Generic, Literal, NoReturn, Sequence, TypeVar, cast
 
 import modal
 
 from mini.types import Q_MAX_LEN, AsyncHandler, Handler, SyncHandler
-from mini.utils import coerce_to_async
+from mini.utils import is_async_function
 
 log = logging.getLogger(__name__)
 
 T = TypeVar('T')
 
 
+@dataclass
+class Producer(Generic[T]):
+    """Sends values to a consumer. Calling it is the same as calling `send`."""
+
+    send: SyncHandler[list[T]]
+    """Buffer values, and send them once enough have accumulated."""
+    flush: Callable[[], None]
+    """Send any buffered values now."""
+
+    def __call__(self, values: list[T]) -> None:
+        self.send(values)
+
+
 @asynccontextmanager
 async def send_batch_to(
     receive: Handler[list[T]],
     trailing_timeout: float | None = 5,
-) -> AsyncGenerator[SyncHandler[list[T]]]:
+    buffer_size: int = 1,
+    max_inflight: int | None = None,
+    max_batch_size: int = Q_MAX_LEN,
+    errors: Literal['throw', 'log'] = 'log',
+    consumer_concurrency: int = 1,
+) -> AsyncGenerator[Producer[T]]:
     """
     Create a distributed producer-consumer for batch processing with Modal.
 
     This async context manager sets up a distributed queue system where multiple
-    producers can send batches of values to a single consumer function. The context
-    yields a function that producers can call to send batches of values.
+    producers can send batches of values to a local consumer function. The context
+    yields a producer that can be called to send batches of values.
 
     Inside the context, a consumer task continuously reads batches from the queue
     and processes them using the provided `receive` function. The consumer will
@@ -38,96 +61,214 @@ async def send_batch_to(
             on its type.
         trailing_timeout: Number of seconds to wait for trailing messages after
             the context manager exits. If None, waits indefinitely.
+        buffer_size: Number of values to buffer in the producer before sending
+            them to the consumer. Each flush costs one queue round-trip, so larger
+            values amortize that cost over more calls. Buffered values are flushed
+            when the context manager exits, but only for the local copy of the
+            producer: remote workers get their own pickled copy, so they must call
+            `flush()` before returning or the values they buffered are lost.
+        max_inflight: If set, producers wait (with exponential backoff) while the
+            queue holds at least this many values, so a fast producer can't run
+            far ahead of the consumer. This costs an extra queue round-trip per
+            flush. Only use it when producers run remotely: a producer that waits
+            on the consumer's event loop would stop the consumer too.
+        max_batch_size: Maximum number of values to pass to `receive` at once.
+            Batches are otherwise as large as whatever is waiting on the queue:
+            a single value at low load, everything at high load.
         errors: How to handle errors in trailing message processing:
             - 'throw': Raises a TimeoutError if trailing message processing times out
             - 'log': Logs a warning if trailing message processing times out
+        consumer_concurrency: Number of consumer tasks reading from the queue. With
+            more than one, an async `receive` can handle several batches at once
+            (useful if it does I/O), but batches may finish out of order.
 
     Yields:
-        send: A function that accepts a list of values to send to the consumer.
-            This function can be called from multiple distributed workers.
+        producer: A callable that accepts a list of values to send to the consumer.
+            It can be called from multiple distributed workers. Call `flush()` to
+            send buffered values without waiting for `buffer_size` values.
 
     Example:
         ```python
         async def process_batch(items: list[str]) -> None:
             print(f"Processing {len(items)} items")
 
-        async with _send_batch_to(process_batch) as send_batch:
+        async with send_batch_to(process_batch, buffer_size=100) as send_batch:
             # This can be called from multiple distributed workers
             send_batch(["item1", "item2", "item3"])
+            send_batch.flush()
         ```
 
     """
+    if max_inflight is not None and max_inflight < 1:
+        raise ValueError(f'max_inflight must be at least 1, got {max_inflight}')
+    if not 1 <= max_batch_size <= Q_MAX_LEN:
+        raise ValueError(f'max_batch_size must be between 1 and {Q_MAX_LEN}, got {max_batch_size}')
+    if consumer_concurrency < 1:
+        raise ValueError(f'consumer_concurrency must be at least 1, got {consumer_concurrency}')
+
     async with modal.Queue.ephemeral() as q:
+        buffered = _LocalBuffer()
+        produce_batch, flush = _producer_batch(q, buffered, buffer_size, max_inflight)
         # Wrap, but remove the reference to the wrapped function so it doesn't get serialized.
-        produce = wraps(receive)(_producer_batch(q))
-        del produce.__wrapped__
+        producer = Producer[T](send=wraps(receive)(produce_batch), flush=flush)
+        del producer.send.__wrapped__
 
-        consume, stop = _batched_consumer(q, receive)
+        consume, stop = _batched_consumer(q, receive, max_batch_size, consumer_concurrency)
 
-        log.debug('Starting consumer task')
-        task = asyncio.create_task(consume())
         try:
-            # The caller can send this to remote workers to put messages on the queue.
-            yield produce
-        finally:
-            log.debug('Stopping consumer task')
-            stop()
-            try:
-                await asyncio.wait_for(task, trailing_timeout)
-            except TimeoutError:
-                log.warning('Timed out waiting for trailing messages')
+            # The task group cancels the consumer if the caller is cancelled,
+            # and cancels the caller if the consumer fails.
+            async with asyncio.TaskGroup() as tg:
+                log.debug('Starting %d consumer task(s)', consumer_concurrency)
+                tasks = [tg.create_task(consume()) for _ in range(consumer_concurrency)]
+                try:
+                    # The caller can send this to remote workers to put messages on the queue.
+                    yield producer
+                finally:
+                    log.debug('Stopping consumer task(s)')
+                    # Values still buffered locally go out with the stop sentinels.
+                    trailing = list(buffered)
+                    buffered.clear()
+                    await stop(trailing)
+
+                    # Unlike wait_for, this doesn't raise the consumers' errors: the task group does that.
+                    # No need to clear the queue afterwards: it's ephemeral, so it's
+                    # deleted when the context exits.
+                    _, pending = await asyncio.wait(tasks, timeout=trailing_timeout)
+                    if pending:
+                        for task in pending:
+                            task.cancel()
+                        if errors == 'throw':
+                            raise TimeoutError('Timed out waiting for trailing messages')
+                        log.warning('Timed out waiting for trailing messages')
+        except BaseExceptionGroup as group:
+            # Unwrap lone errors so that callers see the exception that was actually raised.
+            if len(group.exceptions) == 1:
+                _reraise_unchanged(group.exceptions[0])
+            raise
+
+
+def _reraise_unchanged(exc: BaseException) -> NoReturn:
+    """Raise `exc` again, keeping its original cause and context."""
+    # Raising inside an except block would otherwise chain it to the exception being handled.
+    cause, context, suppress_context = exc.__cause__, exc.__context__, exc.__suppress_context__
+    try:
+        raise exc
+    finally:
+        exc.__cause__, exc.__context__ = cause, context
+        exc.__suppress_context__ = suppress_context
+
+
+def _producer_batch(q: modal.Queue, buffered: deque, buffer_size: int, max_inflight: int | None):
+    # The producer gets pickled and sent to remote workers, so use partials of
+    # top-level functions rather than closures: they're pickled by reference,
+    # which keeps the payload down to the bound arguments.
+    return (
+        partial(_produce_batch, q, buffered, buffer_size, max_inflight),
+        partial(_flush, q, buffered),
+    )
 
 
-def _producer_batch(q: modal.Queue):
-    def produce_batch(values: list[T]) -> None:
-        """Send values to the consumer."""
-        # This function is yielded as the context, so there may be several
-        # distributed producers. It gets pickled and sent to remote workers
-        # for execution, so we can't use local synchronization mechanisms.
-        # All we have is a distributed queue - but we can send signals on a
-        # separate control partition of that queue. Using a control channel
-        # avoids the need for polling and timeouts.
+class _LocalBuffer(deque):
+    """A buffer whose contents stay in the process that added them."""
 
-        # Emit values.
-        q.put_many(values)
+    def __reduce__(self):
+        # Pickled copies start empty. Otherwise a remote worker would send
+        # values that the local producer still holds, and they'd arrive twice.
+        return (type(self), ())
 
-        # Notify consumer.
-        q.put(True, partition='signal')
 
-    return produce_batch
+def _produce_batch(
+    q: modal.Queue,
+    buffered: deque,
+    buffer_size: int,
+    max_inflight: int | None,
+    values: list,
+) -> None:
+    """Send values to the consumer."""
+    # This function is yielded as the context, so there may be several
+    # distributed producers. It gets pickled and sent to remote workers
+    # for execution, so we can't use local synchronization mechanisms.
+    # All we have is a distributed queue. The consumer blocks on the data
+    # partition itself, so the values are their own signal.
+    buffered.extend(values)
+    if len(buffered) >= buffer_size:
+        if max_inflight is not None:
+            _wait_for_capacity(q, max_inflight)
+        _flush(q, buffered)
 
 
-def _batched_consumer(q: modal.Queue, receive: Handler[list[T]]):
-    areceive: AsyncHandler[list[T]] = coerce_to_async(receive)
-    stop_event = asyncio.Event()
+def _flush(q: modal.Queue, buffered: deque) -> None:
+    """Send buffered values to the consumer."""
+    # Modal caps each request at Q_MAX_LEN items, so send large buffers in
+    # chunks. The producer is synchronous, so the chunks go one at a time.
+    # Values are only dropped from the buffer once they've been sent, so if
+    # a put fails, a later flush resumes from the first unsent chunk.
+    while buffered:
+        chunk = list(islice(buffered, Q_MAX_LEN))
+        q.put_many(chunk)
+        for _ in chunk:
+            buffered.popleft()
+
+
+def _wait_for_capacity(q: modal.Queue, max_inflight: int, max_delay: float = 1) -> None:
+    """Block until the queue holds fewer than `max_inflight` values."""
+    delay = 0.01
+    while q.len() >= max_inflight:
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+class _Control(Enum):
+    """Control messages, sent on the data partition after any values."""
+
+    # Enum members unpickle as the same object, so they survive the round-trip through the queue.
+    STOP = 'stop'
+
+
+def _batched_consumer(
+    q: modal.Queue,
+    receive: Handler[list[T]],
+    max_batch_size: int = Q_MAX_LEN,
+    consumers: int = 1,
+):
+    # Check once, so synchronous receivers aren't wrapped in a coroutine per batch.
+    is_async = is_async_function(receive)
 
     async def batched_consume() -> None:
         """Take values from the queue until the context manager exits."""
-        # This function is not exposed, so there's exactly one consumer.
-        # It always runs locally.
+        # This function is not exposed, so there are exactly `consumers` of
+        # these running. They always run locally.
 
         while True:
-            # Wait until values are produced or the context manager exits.
-            get_task = asyncio.create_task(q.get_many.aio(Q_MAX_LEN, partition='signal'))
-            stop_task = asyncio.create_task(stop_event.wait())
-            done, _ = await asyncio.wait(
-                [get_task, stop_task],
-                return_when=asyncio.FIRST_COMPLETED,
-            )
-
-            # Either way, get all available messages.
-            values: list[T] = await q.get_many.aio(Q_MAX_LEN, block=False)
+            # Block until values are produced. get_many returns as soon as
+            # anything is available, up to the limit, so batches adapt to load
+            # without needing to check the queue length first. The stop sentinel
+            # arrives on the same partition after any trailing values, so there's
+            # nothing else to wait for.
+            values: list = await q.get_many.aio(max_batch_size)
+            # Compare by identity: == on arbitrary values (e.g. arrays) may not return a bool.
+            stops = sum(v is _Control.STOP for v in values)
+            if stops:
+                values = [v for v in values if v is not _Control.STOP]
+                if stops > 1:
+                    # There's one sentinel per consumer, so return the others' sentinels.
+                    await q.put_many.aio([_Control.STOP] * (stops - 1))
+
             if values:
-                await areceive(values)
+                if is_async:
+                    await cast(AsyncHandler[list[T]], receive)(values)
+                else:
+                    receive(values)
 
-            # Can't just check stop_event.is_set here; we need to know
-            # whether it was set before the last batch.
-            if stop_task in done:
-                await q.clear.aio(all=True)
+            if stops:
                 break
 
-    def stop():
-        """Stop the consumer."""
-        stop_event.set()
+    async def stop(trailing: Sequence = ()):
+        """Stop the consumers once they have handled all values sent so far, followed by `trailing`."""
+        # Send the sentinels in the same request as the last values, to save a round-trip.
+        messages = [*trailing, *[_Control.STOP] * consumers]
+        for i in range(0, len(messages), Q_MAX_LEN):
+            await q.put_many.aio(messages[i : i + Q_MAX_LEN])
 
     return batched_consume, stop
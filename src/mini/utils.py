@@ -1,14 +1,35 @@
 import inspect
 from functools import wraps
 from typing import Awaitable, Callable, ParamSpec, TypeVar, cast
+from weakref import WeakKeyDictionary
 
 P = ParamSpec('P')
 R = TypeVar('R')
 
+_is_async_cache: WeakKeyDictionary[Callable, bool] = WeakKeyDictionary()
+
+
+def is_async_function(fn: Callable) -> bool:
+    """Check whether `fn` is a coroutine function, caching the answer per function."""
+    # Bound methods are created on each attribute access, so key on the underlying function.
+    key = getattr(fn, '__func__', fn)
+    try:
+        return _is_async_cache[key]
+    except (KeyError, TypeError):
+        pass
+
+    result = inspect.iscoroutinefunction(fn)
+    try:
+        _is_async_cache[key] = result
+    except TypeError:
+        # Not weak-referenceable (e.g. a builtin), so it can't be cached.
+        pass
+    return result
+
 
 def coerce_to_async(fn: Callable[P, R | Awaitable[R]]) -> Callable[P, Awaitable[R]]:
-    if inspect.iscoroutinefunction(fn):
-        return fn
+    if is_async_function(fn):
+        return cast(Callable[P, Awaitable[R]], fn)
 
     fn = cast(Callable[P, R], fn)
 
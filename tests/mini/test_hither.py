@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 from typing import List
 from unittest.mock import AsyncMock, Mock, call, patch
@@ -175,6 +176,115 @@ async def test_batched_callback_execution(mock_send_batch_to):
     callback_mock.assert_has_calls([call(1, 'a'), call(2, 'b', extra=True), call(3, 'c')])
 
 
+async def test_batched_callback_sync(mock_send_batch_to):
+    """Test that _run_hither calls synchronous callbacks without wrapping them in coroutines."""
+    callback_mock = Mock()
+
+    mock, _, _ = mock_send_batch_to
+
+    async with _run_hither(callback_mock) as _:
+        pass
+
+    batched_callback = mock.call_args[0][0]
+    await batched_callback([Params((1, 'a'), {}), Params((2, 'b'), {})])
+    callback_mock.assert_has_calls([call(1, 'a'), call(2, 'b')])
+
+
+async def test_batched_callback_async_callable(mock_send_batch_to):
+    """Test that _run_hither awaits the results of async callables that aren't coroutine functions."""
+    hits = []
+
+    class AsyncCallable:
+        async def __call__(self, x: int) -> None:
+            hits.append(x)
+
+    @asynccontextmanager
+    async def callback_cm():
+        yield AsyncCallable()
+
+    mock, _, _ = mock_send_batch_to
+
+    async with _run_hither_cm(callback_cm()) as _:
+        pass
+
+    batched_callback = mock.call_args[0][0]
+    await batched_callback([Params((1,), {})])
+    assert hits == [1]
+
+
+async def test_batched_callback_yields(mock_send_batch_to):
+    """Test that _run_hither periodically yields to the event loop during large batches."""
+    callback_mock = AsyncMock()
+
+    mock, _, _ = mock_send_batch_to
+
+    async with _run_hither(callback_mock, yield_every=2) as _:
+        pass
+
+    batched_callback = mock.call_args[0][0]
+
+    with patch('mini.hither.asyncio.sleep') as sleep:
+        await batched_callback([Params((i,), {}) for i in range(5)])
+
+    assert callback_mock.call_count == 5
+    assert sleep.call_count == 2
+
+
+async def test_batched_callback_concurrency(mock_send_batch_to):
+    """Test that _run_hither runs calls concurrently, up to the limit."""
+    running = 0
+    peak = 0
+
+    async def callback(_x: int) -> None:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    mock, _, _ = mock_send_batch_to
+    semaphore = asyncio.Semaphore(2)
+
+    with patch('mini.hither.asyncio.Semaphore', return_value=semaphore):
+        async with _run_hither(callback, concurrency=2) as _:
+            pass
+
+    batched_callback = mock.call_args[0][0]
+    with patch.object(semaphore, 'acquire', wraps=semaphore.acquire) as acquire:
+        await batched_callback([Params((i,), {}) for i in range(5)])
+        assert peak == 2
+        assert acquire.call_count == 5
+
+        # Small batches skip the limiter
+        peak = 0
+        await batched_callback([Params((i,), {}) for i in range(2)])
+        assert peak == 2
+        assert acquire.call_count == 5
+
+
+async def test_batched_callback_concurrency_cancels_on_error(mock_send_batch_to):
+    """Test that a failing call cancels the rest of a concurrent batch."""
+    finished = []
+
+    async def callback(x: int) -> None:
+        if x == 0:
+            raise ValueError()
+        await asyncio.sleep(0.01)
+        finished.append(x)
+
+    mock, _, _ = mock_send_batch_to
+
+    async with _run_hither(callback, concurrency=2) as _:
+        pass
+
+    batched_callback = mock.call_args[0][0]
+    with pytest.raises(ExceptionGroup):
+        await batched_callback([Params((i,), {}) for i in range(3)])
+
+    await asyncio.sleep(0.02)
+    assert finished == []
+
+
 async def test_run_hither_callback(mock_send_batch_to):
     """run_hither(callback)"""
     with patch('mini.hither._run_hither') as mock_run:
@@ -184,7 +294,19 @@ async def test_run_hither_callback(mock_send_batch_to):
         async with run_hither(stub_callback) as _:
             pass
 
-        mock_run.assert_called_once_with(stub_callback)
+        mock_run.assert_called_once_with(stub_callback, concurrency=1, yield_every=1024)
+
+
+@pytest.mark.parametrize('concurrency', [0, -1])
+def test_run_hither_rejects_invalid_concurrency(concurrency):
+    with pytest.raises(ValueError):
+        run_hither(stub_callback, concurrency=concurrency)
+
+
+@pytest.mark.parametrize('yield_every', [0, -1])
+def test_run_hither_rejects_invalid_yield_every(yield_every):
+    with pytest.raises(ValueError):
+        run_hither(stub_callback, yield_every=yield_every)
 
 
 async def test_run_hither_factory(mock_send_batch_to):
@@ -195,7 +317,7 @@ async def test_run_hither_factory(mock_send_batch_to):
         async with run_hither(stub_cb_factory)() as _:
             pass
 
-        mock_run.assert_called_once_with(stub_callback)
+        mock_run.assert_called_once_with(stub_callback, concurrency=1, yield_every=1024)
 
 
 async def test_run_hither_context_manager(mock_send_batch_to):
@@ -207,7 +329,7 @@ async def test_run_hither_context_manager(mock_send_batch_to):
         async with run_hither(cm) as _:
             pass
 
-        _run_hither.assert_called_once_with(stub_callback)
+        _run_hither.assert_called_once_with(stub_callback, concurrency=1, yield_every=1024)
 
 
 async def test_run_hither_decorated_context_manager(mock_send_batch_to):
@@ -219,7 +341,7 @@ async def test_run_hither_decorated_context_manager(mock_send_batch_to):
         async with run_hither(decorated_stub_cb_cm)() as _:
             pass
 
-        _run_hither.assert_called_once_with(stub_callback)
+        _run_hither.assert_called_once_with(stub_callback, concurrency=1, yield_every=1024)
 
 
 async def test_run_hither_batch_callback(mock_send_batch_to):
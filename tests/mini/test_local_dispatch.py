@@ -0,0 +1,332 @@
+import asyncio
+import pickle
+import queue
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from unittest.mock import Mock, patch
+
+import pytest
+
+from mini.local_dispatch import _LocalBuffer, _producer_batch, _wait_for_capacity, send_batch_to
+
+
+class FakeMethod:
+    """Mimics a Modal method, which can be called directly or via `.aio`."""
+
+    def __init__(self, fn, afn):
+        self._fn = fn
+        self.aio = afn
+
+    def __call__(self, *args, **kwargs):
+        return self._fn(*args, **kwargs)
+
+
+class FakeQueue:
+    """In-memory stand-in for `modal.Queue`, for use on a single event loop."""
+
+    def __init__(self):
+        self.partitions: defaultdict[str | None, deque] = defaultdict(deque)
+        self.calls: list[str] = []
+        self._changed = asyncio.Event()
+
+        self.put_many = FakeMethod(self._put_many, self._aput_many)
+        self.len = FakeMethod(self._len, None)
+        self.get_many = FakeMethod(None, self._get_many)
+
+    def _put_many(self, vs, *, partition=None):
+        self.calls.append('put_many')
+        self.partitions[partition].extend(vs)
+        self._changed.set()
+
+    async def _aput_many(self, vs, *, partition=None):
+        self.calls.append('put_many.aio')
+        self.partitions[partition].extend(vs)
+        self._changed.set()
+
+    def _len(self, *, partition=None):
+        self.calls.append('len')
+        return len(self.partitions[partition])
+
+    async def _get_many(self, n_values, block=True, timeout=None, *, partition=None):
+        self.calls.append('get_many')
+        items = self.partitions[partition]
+        if block and not items:
+            try:
+                while not items:
+                    self._changed.clear()
+                    await asyncio.wait_for(self._changed.wait(), timeout)
+            except TimeoutError:
+                raise queue.Empty() from None
+        return [items.popleft() for _ in range(min(n_values, len(items)))]
+
+
+@pytest.fixture
+def fake_queue():
+    q = FakeQueue()
+
+    @asynccontextmanager
+    async def ephemeral():
+        yield q
+
+    with patch('mini.local_dispatch.modal.Queue.ephemeral', ephemeral):
+        yield q
+
+
+async def test_send_batch_to_delivers_values(fake_queue):
+    received = []
+
+    async def receive(values: list[int]):
+        received.extend(values)
+
+    async with send_batch_to(receive) as send:
+        send([1, 2])
+        send([3])
+
+    assert received == [1, 2, 3]
+
+
+async def test_send_batch_to_sync_receiver(fake_queue):
+    received = []
+
+    async with send_batch_to(received.extend) as send:
+        send([1, 2, 3])
+
+    assert received == [1, 2, 3]
+    assert fake_queue.calls == ['put_many', 'put_many.aio', 'get_many']
+
+
+async def test_send_batch_to_coalesces_sends(fake_queue):
+    received = []
+
+    async with send_batch_to(received.extend, buffer_size=3) as send:
+        send([1])
+        send([2])
+        assert fake_queue.calls.count('put_many') == 0
+        send([3])
+        assert fake_queue.calls.count('put_many') == 1
+        send([4])
+
+    # Trailing values are sent along with the stop sentinel when the context exits
+    assert received == [1, 2, 3, 4]
+    assert fake_queue.calls.count('put_many') == 1
+    assert fake_queue.calls.count('put_many.aio') == 1
+
+
+async def test_send_batch_to_delivers_while_waiting(fake_queue):
+    received = []
+
+    async with send_batch_to(received.extend) as send:
+        send([1])
+        await asyncio.sleep(0.01)
+        assert received == [1]
+        send([2, 3])
+        await asyncio.sleep(0.01)
+        assert received == [1, 2, 3]
+        send([4])
+
+    assert received == [1, 2, 3, 4]
+
+
+async def test_send_batch_to_chunks_large_batches(fake_queue):
+    received = []
+
+    async with send_batch_to(received.extend) as send:
+        send(list(range(12_000)))
+
+    assert received == list(range(12_000))
+    assert fake_queue.calls.count('put_many') == 3
+
+
+def test_wait_for_capacity_backs_off():
+    q = Mock(len=Mock(side_effect=[3, 3, 2, 1]))
+
+    with patch('mini.local_dispatch.time.sleep') as sleep:
+        _wait_for_capacity(q, max_inflight=2)
+
+    assert q.len.call_count == 4
+    assert [c.args[0] for c in sleep.call_args_list] == [0.01, 0.02, 0.04]
+
+
+async def test_send_batch_to_waits_for_capacity(fake_queue):
+    received = []
+
+    async with send_batch_to(received.extend, buffer_size=2, max_inflight=10) as send:
+        send([1, 2])
+        send([3])
+
+    assert received == [1, 2, 3]
+    # The producer checks the queue length before flushing, but the flush on exit doesn't wait
+    assert fake_queue.calls[:2] == ['len', 'put_many']
+    assert fake_queue.calls.count('len') == 1
+
+
+async def test_send_batch_to_rejects_invalid_max_inflight(fake_queue):
+    with pytest.raises(ValueError):
+        async with send_batch_to(print, max_inflight=0):
+            pass
+
+
+async def test_send_batch_to_limits_batch_size(fake_queue):
+    batches = []
+
+    async with send_batch_to(batches.append, max_batch_size=2) as send:
+        send([1, 2, 3, 4, 5])
+
+    assert batches == [[1, 2], [3, 4], [5]]
+
+
+async def test_send_batch_to_rejects_invalid_batch_size(fake_queue):
+    with pytest.raises(ValueError):
+        async with send_batch_to(print, max_batch_size=0):
+            pass
+
+
+async def test_send_batch_to_resumes_after_failed_put(fake_queue):
+    received = []
+    put_many = fake_queue.put_many._fn
+    fail = iter([False, True])
+
+    def flaky_put_many(vs, **kwargs):
+        if next(fail, False):
+            raise ConnectionError()
+        put_many(vs, **kwargs)
+
+    fake_queue.put_many._fn = flaky_put_many
+
+    async with send_batch_to(received.extend) as send:
+        with pytest.raises(ConnectionError):
+            send(list(range(6_000)))
+
+    # The first chunk was sent once; the second was retried on exit
+    assert received == list(range(6_000))
+
+
+async def test_send_batch_to_flush(fake_queue):
+    received = []
+
+    async with send_batch_to(received.extend, buffer_size=100) as producer:
+        producer.send([1, 2])
+        producer([3])
+        assert fake_queue.calls.count('put_many') == 0
+        producer.flush()
+        assert fake_queue.calls.count('put_many') == 1
+        await asyncio.sleep(0.01)
+        assert received == [1, 2, 3]
+
+
+async def test_send_batch_to_propagates_caller_error(fake_queue):
+    received = []
+
+    with pytest.raises(ValueError):
+        async with send_batch_to(received.extend) as send:
+            send([1])
+            raise ValueError()
+
+    assert received == [1]
+
+
+async def test_send_batch_to_propagates_consumer_error(fake_queue):
+    def receive(values: list[int]):
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        async with send_batch_to(receive) as send:
+            send([1])
+            await asyncio.sleep(1)
+
+
+async def test_send_batch_to_preserves_caller_exception_chain(fake_queue):
+    with pytest.raises(ValueError) as exc_info:
+        async with send_batch_to(print):
+            try:
+                raise KeyError()
+            except KeyError as e:
+                raise ValueError() from e
+
+    assert isinstance(exc_info.value.__cause__, KeyError)
+    assert exc_info.value.__suppress_context__
+
+
+async def test_send_batch_to_preserves_consumer_exception_chain(fake_queue):
+    def receive(values: list[int]):
+        try:
+            raise KeyError()
+        except KeyError as e:
+            raise ValueError() from e
+
+    with pytest.raises(ValueError) as exc_info:
+        async with send_batch_to(receive) as send:
+            send([1])
+            await asyncio.sleep(1)
+
+    assert isinstance(exc_info.value.__cause__, KeyError)
+    assert isinstance(exc_info.value.__context__, KeyError)
+
+
+async def test_send_batch_to_trailing_timeout(fake_queue):
+    async def receive(values: list[int]):
+        await asyncio.sleep(1)
+
+    with pytest.raises(TimeoutError):
+        async with send_batch_to(receive, trailing_timeout=0.01, errors='throw') as send:
+            send([1])
+
+
+async def test_send_batch_to_values_with_elementwise_eq(fake_queue):
+    class Array(list):
+        def __eq__(self, _other):
+            raise ValueError('The truth value of an array is ambiguous')
+
+    received = []
+    value = Array([1, 2])
+
+    async with send_batch_to(received.extend) as send:
+        send([value])
+
+    assert len(received) == 1 and received[0] is value
+
+
+async def test_send_batch_to_concurrent_consumers(fake_queue):
+    received = []
+    running = 0
+    peak = 0
+
+    async def receive(values: list[int]):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        received.extend(values)
+        running -= 1
+
+    async with send_batch_to(receive, max_batch_size=1, consumer_concurrency=3) as send:
+        send([1, 2, 3, 4, 5])
+
+    assert sorted(received) == [1, 2, 3, 4, 5]
+    assert peak == 3
+
+
+async def test_send_batch_to_consumer_takes_all_sentinels(fake_queue):
+    received = []
+
+    async with send_batch_to(received.extend, consumer_concurrency=3, trailing_timeout=1, errors='throw'):
+        pass
+
+    assert received == []
+    # With nothing to do, the first consumer to wake up gets every sentinel at
+    # once, and puts back the ones meant for the other consumers
+    assert fake_queue.calls[:3] == ['put_many.aio', 'get_many', 'put_many.aio']
+    # Each consumer took a sentinel and finished
+    assert fake_queue.calls.count('get_many') == 3
+
+
+def test_producer_pickles_without_buffered_values():
+    send, flush = _producer_batch(None, _LocalBuffer(), buffer_size=10, max_inflight=None)  # type: ignore
+    send([1, 2, 3])
+
+    remote_send, remote_flush = pickle.loads(pickle.dumps((send, flush)))
+
+    # The buffer is still shared, but values buffered locally aren't copied
+    assert remote_send.args[1] is remote_flush.args[1]
+    assert list(remote_send.args[1]) == []
+    assert list(send.args[1]) == [1, 2, 3]
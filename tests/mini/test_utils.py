@@ -0,0 +1,45 @@
+from unittest.mock import AsyncMock, Mock
+
+from mini.utils import _is_async_cache, coerce_to_async, is_async_function
+
+
+async def async_fn():
+    pass
+
+
+def sync_fn():
+    pass
+
+
+class Receiver:
+    async def receive(self):
+        pass
+
+
+def test_is_async_function():
+    assert is_async_function(async_fn)
+    assert not is_async_function(sync_fn)
+    assert is_async_function(AsyncMock())
+    assert not is_async_function(Mock())
+
+
+def test_is_async_function_caches():
+    is_async_function(async_fn)
+    assert _is_async_cache[async_fn] is True
+
+
+def test_is_async_function_bound_method():
+    assert is_async_function(Receiver().receive)
+    assert _is_async_cache[Receiver.receive] is True
+
+
+def test_is_async_function_builtin():
+    assert not is_async_function([].append)
+
+
+async def test_coerce_to_async():
+    assert coerce_to_async(async_fn) is async_fn
+
+    wrapped = coerce_to_async(lambda x: x + 1)
+    assert is_async_function(wrapped)
+    assert await wrapped(1) == 2